@@ -0,0 +1,17 @@
+"""Gunicorn settings, picked up automatically by `gunicorn app:app`."""
+
+bind = "127.0.0.1:5000"
+workers = 2
+# Threaded workers: /api/comments is served from the in-memory cache, so
+# requests within a worker run in parallel without contention.
+worker_class = "gthread"
+threads = 8
+
+
+def post_worker_init(worker):
+    # Each worker tries to start the scraper; the flock in
+    # start_background_scraper ensures only one actually does.
+    from app import start_background_scraper
+
+    if start_background_scraper():
+        worker.log.info("Background scraper started in worker %s", worker.pid)
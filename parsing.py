@@ -0,0 +1,279 @@
+"""
+Pick extraction from Reddit comment listings.
+
+Kept free of Flask and I/O so it can be compiled ahead of time with mypyc
+(`mypyc parsing.py`); the resulting extension module is imported in place
+of this file when present, and this pure-Python version is used otherwise.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Compiled once at import; these run per line / per pick on every load.
+#
+# Team names are capped at 41 characters, so backtracking stays linear in the
+# line length (the old unbounded nested `[A-Za-z\s]+?` groups were
+# exponential). Lazy, like the old pattern, so "A ML B ML" is two picks.
+_TEAM = r'[A-Z][A-Za-z ]{0,40}?'
+_SIDE_BET = r'(?:ML|BTTS)'
+_TOTAL = r'(?:Over|Under)\s+[+\-]?[\d.]+(?:\s+goals?)?'
+_BET = rf'(?:{_SIDE_BET}|{_TOTAL})'
+_ODDS = r'(?:\s*@\s*([\d.]+))?'
+
+# "Team vs Team - Bet @ odds"
+_MATCHUP_RE = re.compile(
+    rf'({_TEAM})\s+(?:vs?\.?|v)\s+({_TEAM})\s*[-–,]\s*((?:{_TEAM}\s+)?{_BET}){_ODDS}',
+    re.IGNORECASE,
+)
+# "Team ML @ odds", "Over 2.5 goals"; ML/BTTS always need a team, only
+# totals may stand alone.
+_SINGLE_RE = re.compile(
+    rf'(?:({_TEAM})\s+({_SIDE_BET})|(?:({_TEAM})\s+)?({_TOTAL})){_ODDS}',
+    re.IGNORECASE,
+)
+# "Team vs Team - anything", used only when nothing else matched
+_MATCHUP_FALLBACK_RE = re.compile(
+    rf'({_TEAM})\s+(?:vs?\.?|v)\s+({_TEAM})\s*[-–]\s*([A-Za-z]+(?: [A-Za-z]+){{0,3}}){_ODDS}',
+    re.IGNORECASE,
+)
+# Every pattern above needs one of these (upper-cased) to match, or a "vs"/"v"
+# separator after any whitespace (including \xa0 and tabs) for the matchup
+# fallback.
+_KEYWORDS = ("ML", "BTTS", "OVER", "UNDER")
+_VS_SEP_RE = re.compile(r'\sv', re.IGNORECASE)
+# Lines longer than this are prose, not picks; skip them outright.
+_MAX_LINE_LEN = 500
+_SEP_RE = re.compile(r'[@\(\)\[\]:\-–,]')
+_NUM_RE = re.compile(r'\d+\.?\d*\s*(?:odds)?')
+_OU_RE = re.compile(r'(over|under)\s+([+\-]?[\d.]+)')
+
+# Bet type aliases
+_ALIAS_TO_CANON = {
+    'ml': 'moneyline',
+    'moneyline': 'moneyline',
+    'money line': 'moneyline',
+    'to win': 'moneyline',
+    'btts': 'both_teams_to_score',
+    'both teams to score': 'both_teams_to_score',
+    'dnb': 'draw_no_bet',
+    'draw no bet': 'draw_no_bet',
+    'ah': 'asian_handicap',
+    'asian handicap': 'asian_handicap',
+}
+# Longest aliases first so "ml" can never shadow "moneyline"
+_BET_ALIAS_RE = re.compile(
+    r'\b(' + '|'.join(re.escape(a) for a in sorted(_ALIAS_TO_CANON, key=len, reverse=True)) + r')\b'
+)
+
+
+def _extract_batch(bodies: List[str]) -> List[Tuple[str, str]]:
+    """
+    Extract (picks, notes) for a batch of comment bodies.
+    The one place to fan the work out if listings ever get big enough to need it.
+    """
+    return [extract_picks_and_notes(body) for body in bodies]
+
+
+def parse_children(children: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Extract Reddit comments from a listing's children, including nested replies."""
+    parsed: List[Dict[str, Any]] = []
+    # Walk the reply tree one depth at a time instead of recursing. Each level
+    # pairs batches of children with the list their parsed comments belong in;
+    # replies are only queued under comments that had picks, so skipped
+    # subtrees are never extracted.
+    level: List[tuple[Iterable[Dict[str, Any]], List[Dict[str, Any]]]] = [(children, parsed)]
+
+    while level:
+        nodes: List[tuple[Dict[str, Any], List[Dict[str, Any]]]] = []
+        for current, siblings in level:
+            for child in current:
+                if child.get("kind") != "t1":
+                    # Skip non-comment items like the submission itself.
+                    continue
+                nodes.append((child.get("data", {}), siblings))
+
+        # Extract picks and notes for the whole level in one batch
+        bodies = [data.get("body") or "" for data, _ in nodes]
+        extracted = _extract_batch(bodies)
+
+        level = []
+        for (data, siblings), body, (picks, notes) in zip(nodes, bodies, extracted):
+            # Skip comments without clear betting picks, along with their replies
+            if not picks:
+                continue
+
+            comment = {
+                "id": data.get("id"),
+                "author": data.get("author") or "[deleted]",
+                "body": body,
+                "picks": picks,
+                "notes": notes,
+                "ups": data.get("ups", 0),
+                "downs": data.get("downs", 0),
+                "replies": [],
+            }
+            siblings.append(comment)
+
+            replies = data.get("replies")
+            if isinstance(replies, dict):
+                level.append((replies.get("data", {}).get("children", []), comment["replies"]))
+
+    return parsed
+
+
+def _may_hold_pick(text: str) -> bool:
+    """Substring screen run before the regexes; never rejects a matchable text."""
+    text_upper = text.upper()
+    return any(k in text_upper for k in _KEYWORDS) or _VS_SEP_RE.search(text) is not None
+
+
+def extract_picks_and_notes(body: str) -> tuple[str, str]:
+    """
+    Extract betting picks from comment body using regex patterns.
+    Returns (picks, notes) tuple.
+    """
+    if not body:
+        return "", ""
+
+    # Cheap screen: most comments contain no picks at all
+    if not _may_hold_pick(body):
+        return "", body
+
+    # Stripped, non-empty lines; splitlines also handles \r\n and \u2028
+    lines = [stripped for stripped in (raw.strip() for raw in body.splitlines()) if stripped]
+    extracted_picks: List[str] = []
+    note_lines: List[str] = []
+
+    for line in lines:
+        if not _may_hold_pick(line):
+            note_lines.append(line)
+            continue
+
+        # Extract structured pick fragments (short form) from the line
+        picks_in_line = extract_bet_segments(line)
+
+        if picks_in_line:
+            extracted_picks.extend(picks_in_line)
+            # Keep the original line in notes for context/expand view
+            note_lines.append(line)
+        else:
+            note_lines.append(line)
+
+    # Deduplicate while preserving order
+    unique_picks = list(dict.fromkeys(extracted_picks))
+
+    picks = '\n'.join(unique_picks)
+    notes = '\n'.join(note_lines)
+
+    return picks, notes
+
+
+@lru_cache(maxsize=8192)
+def extract_bet_segments(line: str) -> Tuple[str, ...]:
+    """
+    Extract individual betting picks from a line.
+    Results are cached, hence the immutable tuple.
+
+    >>> extract_bet_segments("Al Nassr ML , Sporting ML @ 2.38 odds")
+    ('Al Nassr ML', 'Sporting ML @ 2.38')
+    >>> extract_bet_segments("Arsenal vs chelsea - BTTS")
+    ('Arsenal vs chelsea - BTTS',)
+    >>> extract_bet_segments("man utd ML")
+    ('man utd ML',)
+    >>> extract_bet_segments("over 2.5 goals")
+    ('over 2.5 goals',)
+
+    ML and BTTS are only picks when a team precedes them:
+
+    >>> extract_bet_segments("@ ML")
+    ()
+
+    Team names run from the leftmost word before the bet, up to 41
+    characters, so multi-word names stay whole and a short lead-in is kept:
+
+    >>> extract_bet_segments("Brighton and Hove Albion vs Manchester United - BTTS")
+    ('Brighton and Hove Albion vs Manchester United - BTTS',)
+    >>> extract_bet_segments("Wolverhampton Wanderers Women FC ML")
+    ('Wolverhampton Wanderers Women FC ML',)
+    >>> extract_bet_segments("I like Arsenal ML")
+    ('I like Arsenal ML',)
+    """
+    if len(line) > _MAX_LINE_LEN:
+        return ()
+
+    found: List[tuple[int, str]] = []
+    taken: List[tuple[int, int]] = []
+
+    # First pass: full matchups (Team vs Team - Bet @ odds)
+    for match in _MATCHUP_RE.finditer(line):
+        team1, team2, bet, odds = match.groups()
+        pick = f"{team1.strip()} vs {team2.strip()} - {bet.strip()}"
+        if odds:
+            pick = f"{pick} @ {odds}"
+        found.append((match.start(), pick))
+        taken.append(match.span())
+
+    # Second pass: single-team picks and bare totals outside any matchup
+    for match in _SINGLE_RE.finditer(line):
+        start, end = match.span()
+        if any(start < t_end and t_start < end for t_start, t_end in taken):
+            continue
+        side_team, side_bet, total_team, total, odds = match.groups()
+        team = side_team or total_team
+        bet = side_bet or total
+        pick = f"{team.strip()} {bet.strip()}" if team else bet.strip()
+        if odds:
+            pick = f"{pick} @ {odds}"
+        found.append((start, pick))
+
+    segments: List[str] = [pick for _, pick in sorted(found)]
+
+    # Fallback: matchups with a free-text bet. Team ML and bare totals are
+    # already covered by the second pass.
+    if not segments:
+        for match in _MATCHUP_FALLBACK_RE.finditer(line):
+            parts = [g.strip() for g in match.groups() if g]
+            pick = ' '.join(parts).strip()
+            if pick:
+                segments.append(pick)
+
+    # Deduplicate while preserving order
+    return tuple(dict.fromkeys(segments))
+
+
+@lru_cache(maxsize=8192)
+def normalize_pick(pick_text: str) -> str:
+    """
+    Normalize a pick into a canonical form for grouping.
+    Handles team names and bet type aliases.
+    """
+    pick_lower = pick_text.lower().strip()
+    
+    # Extract team name and bet type
+    team_name = None
+    bet_type = None
+
+    # Try to find bet type first
+    alias_match = _BET_ALIAS_RE.search(pick_lower)
+    if alias_match:
+        bet_type = _ALIAS_TO_CANON[alias_match.group(1)]
+        # Remove bet type to isolate team name
+        team_name = pick_lower[:alias_match.start()] + pick_lower[alias_match.end():]
+        # Remove common separators and odds
+        team_name = _SEP_RE.sub(' ', team_name)
+        team_name = _NUM_RE.sub('', team_name)
+        team_name = '_'.join(team_name.split())
+
+    # Handle Over/Under separately
+    if not bet_type:
+        over_under_match = _OU_RE.search(pick_lower)
+        if over_under_match:
+            bet_type = over_under_match.group(1)
+            line = over_under_match.group(2)
+            return f"total:{bet_type}_{line}"
+    
+    if team_name and bet_type:
+        return f"{team_name}:{bet_type}"
+    
+    # Fallback: use the whole pick text normalized
+    return '_'.join(pick_lower.split())